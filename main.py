@@ -2,30 +2,63 @@
 # Import necessary libraries
 import random
 import csv
+import re
 import os
-import copy
+import sys
+import array
+import functools
+import itertools
+import hashlib
+import concurrent.futures
+from enum import IntEnum
 
 """
 Each action will have two modes "test" and "perform"
     self.test is a boolean indicating if we are in test mode or perform mode
     In test mode, when an action fails, a string is returned indicating why the action failed, otherise the object is modified according to the aciton
     In perform mode, when an action fails, an exception is thrown (this helps with error tracing)
+Game_State, Player and Played_Industry each provide an explicit .copy(), use those rather than the copy module, which is several times slower
 """
 
-industry_data = {}
-csv_path = os.path.join(os.path.dirname(__file__), "industry_data.csv")
-with open(csv_path, newline='', encoding='utf-8-sig') as csvfile:
-    reader = csv.DictReader(csvfile)
-    for row in reader:
-        key = f"{row['Industry']}{row['Sequence']}"
-        industry_data[key] = dict(row)
+class Industry(IntEnum):
+    # Industry ids, used to index the per industry tables (industry_layout, Player.industry_next)
+    Crate = 0
+    Shed = 1
+    Pottery = 2
+    Beer = 3
+    Iron = 4
+    Coal = 5
+
+class Resource(IntEnum):
+    # Resource ids, used to index Game_State._supply, member names match the resource strings of action arguments
+    Coal = 0
+    Iron = 1
+    Beer = 2
+
+resource_ids = {member.name: member for member in Resource}
+# Resources of a rail link, shared so a network action does not build them on every call
+rail_link_resources = (Resource.Coal,)
+second_rail_link_resources = (Resource.Coal, Resource.Beer)
+
+def resource_names(resource_id_list) -> list[str]:
+    # Resource strings of a sequence of resource ids, for messages, ids of unknown resources (-1) are shown as "Unknown"
+    return [Resource(resource_id).name if resource_id >= 0 else "Unknown" for resource_id in resource_id_list]
+
+class Age(IntEnum):
+    # Member names match the strings used in the csv and in printouts
+    canal = 0
+    rail = 1
+
+def _noop(*args, **kwargs):
+    # Stand in for recording and printing methods on controllers that are not verbose
+    return None
 
 class Action_Controller:
     def __init__(self, test_mode_flag = False, header_string: str = "", indent_baseline: int = 0, 
                  starting_state_flag: bool = False, possible_actions_flag: bool = False,
                  action_performed_flag: bool = False, action_detail_flag: bool = False, 
                  ending_state_flag: bool = False, ending_state_action_history_flag: bool = False,
-                 blank_line_flag: bool = False, series_mode_flag: bool = False):
+                 blank_line_flag: bool = False, series_mode_flag: bool = False, failure_message_flag: bool = True):
         '''
         A complete action print can looks like this at most:
         Header (^header_flag): Tells what this indented section is for
@@ -56,8 +89,19 @@ class Action_Controller:
         # Series mode flag, if True, then the header and starting state are not printed for each action, only the first action
         self.series_mode_flag = series_mode_flag #Default is parallel mode where headers are re-printed every time
         self.series_header_disable = False #Skips repeating of header & starting state
+        # Failure message flag, if False a silent test mode controller returns a generic failure string instead of formatting the reason
+        self.failure_message_flag = failure_message_flag
         #Set the action list
         self.possible_children = None
+        if not self.verbose:
+            # Nothing will ever be printed, so skip the method calls on the hot path entirely
+            self.record = _noop
+            self.start_action = _noop
+            self.end_action = _noop
+            self.chosen_game_completion = _noop
+        elif not self.action_detail_flag:
+            # Records are only printed with the action details, so verbose controllers without them skip record too
+            self.record = _noop
 
     def indent_pr(self, message: str):
         # Print the message with the appropriate indentation
@@ -116,12 +160,9 @@ class Action_Controller:
         if not self.verbose:
             # If the verbose flag is not set, then do not record the action
             return
-        # If object is a Player, append ".P<player_id>" to name
-        if isinstance(object, Player):
-            name = f"P{object.player_id}.{name}"
-        elif isinstance(object, Played_Industry):
-            # Use the industry tile name, omitting the "P" from the player id
-            name = f"{object.properties.name}.{name}"
+        # Players and played industries scope the name with their own prefix, the game state has no prefix
+        if object._record_prefix is not None:
+            name = f"{object._record_prefix()}.{name}"
         if self.action_detail_flag:
             # If the action_detail_flag is set, then print the action taken
             if delta is not None:
@@ -129,8 +170,14 @@ class Action_Controller:
             elif new_value is not None:
                 self.indent_pr(f"  {name} changed to {new_value}")
     
-    def test(self, string: str):
+    def test(self, string):
         #Test the action string and return a string if the action is invalid
+        #string is either the message or a zero argument callable returning it, so the message is only formatted when it is used
+        if self.test_mode_flag and not self.failure_message_flag and not self.action_detail_flag:
+            #Caller only needs to know that the action failed
+            return "Invalid action"
+        if callable(string):
+            string = string()
         if self.test_mode_flag:
             if self.action_detail_flag:
                 #If the action_detail_flag is set, then print the action taken
@@ -150,56 +197,127 @@ class Action_Controller:
         self.set_possible_children(valid_children)
         chosen_child.parent.take_action_copy(chosen_child.previous_action, self)
 
-silent_test_controller = Action_Controller(test_mode_flag=True)
+# Shared silent controller for test mode validation, it is not verbose so it holds no per action state and is safe to reuse everywhere
+silent_test_controller = Action_Controller(test_mode_flag=True, failure_message_flag=False)
+
+# Zobrist keys, a 64 bit key per state feature, derived from the feature itself so value ranges need not be known up front
+# Every process derives the same key for the same feature, so hashes stay valid when states are pickled between the workers
+_zobrist_keys: dict[tuple, int] = {}
+
+def _zobrist_canonical(value):
+    # IntEnum members compare equal to their ints but repr differently, so they are keyed by their int value
+    if isinstance(value, tuple):
+        return tuple([_zobrist_canonical(item) for item in value])
+    if isinstance(value, int):
+        return int(value)
+    return value
+
+def zobrist_key(feature: tuple) -> int:
+    # Return the key of a state feature, e.g. ("money", player_id, money), memoized as hashing the feature is slow
+    key = _zobrist_keys.get(feature)
+    if key is None:
+        digest = hashlib.blake2b(repr(_zobrist_canonical(feature)).encode(), digest_size=8).digest()
+        key = _zobrist_keys[feature] = int.from_bytes(digest)
+    return key
+
+def _to_int(value: str) -> int:
+    # Convert a csv cell to an int, empty cells are 0
+    return int(value) if value else 0
 
 class Industry_Properties:
+    __slots__ = ("name", "industry", "industry_type", "level", "count", "sequence", "type_total", "money_cost", "coal_cost", "iron_cost",
+                 "industry_id", "age_restriction", "beer_cost", "development_restriction", "coal_production", "iron_production",
+                 "beer_production_canal", "beer_production_rail", "points", "income_levels", "links", "cost_list", "cost_counts", "cost_ids", "beer_list", "beer_ids",
+                 "resource_id", "manufactured", "_initial_resource")
+
+    # Integer csv columns by the attribute they are stored in, empty cells are 0
+    _int_columns = (("level", "Level"), ("count", "Count"), ("sequence", "Sequence"), ("type_total", "Type Total"),
+                    ("money_cost", "Money Cost"), ("coal_cost", "Coal Cost"), ("iron_cost", "Iron Cost"), ("beer_cost", "Beer Cost"),
+                    ("coal_production", "Coal Production"), ("iron_production", "Iron Production"),
+                    ("beer_production_canal", "Beer Production Canal"), ("beer_production_rail", "Beer Production Rail"),
+                    ("points", "Points"), ("income_levels", "Income Levels"), ("links", "Links"))
+
     def __init__(self, name, csvData):
-        self.name = name
-        self.industry = csvData['Industry']
-        self.industry_type = csvData['Industry Type']
-        self.level = int(csvData['Level'])
-        self.count = int(csvData['Count'])
-        self.sequence = int(csvData['Sequence'])
-        self.type_total = int(csvData['Type Total'])
-        self.money_cost = int(csvData['Money Cost'])
-        self.coal_cost = int(csvData['Coal Cost']) if csvData['Coal Cost'] else 0
-        self.iron_cost = int(csvData['Iron Cost']) if csvData['Iron Cost'] else 0
-        self.age_restriction = csvData['Age Resttriction'] #Empty string if no age restriction, otherwise "canal" or "rail"
-        self.beer_cost = int(csvData['Beer Cost']) if csvData['Beer Cost'] else 0
+        self.name = sys.intern(name) #Tile names are used in every print and lookup
+        self.industry = sys.intern(csvData['Industry'])
+        self.industry_id = Industry[self.industry]
+        self.industry_type = sys.intern(csvData['Industry Type'])
+        self.manufactured = self.industry_type == "Manufactured"
+        self.resource_id = resource_ids.get(self.industry) #Resource produced by the tile, None for manufactured industries
+        for attribute, column in self._int_columns:
+            setattr(self, attribute, _to_int(csvData[column]))
+        self.age_restriction = Age[csvData['Age Resttriction']] if csvData['Age Resttriction'] else None #None if no age restriction, otherwise Age.canal or Age.rail
         self.development_restriction = True if csvData['Development Restriction'] else False
-        self.coal_production = int(csvData['Coal Production']) if csvData['Coal Production'] else 0
-        self.iron_production = int(csvData['Iron Production']) if csvData['Iron Production'] else 0
-        self.beer_production_canal = int(csvData['Beer Production Canal']) if csvData['Beer Production Canal'] else 0
-        self.beer_production_rail = int(csvData['Beer Production Rail']) if csvData['Beer Production Rail'] else 0
-        self.points = int(csvData['Points']) if csvData['Points'] else 0
-        self.income_levels = int(csvData['Income Levels']) if csvData['Income Levels'] else 0
-        self.links = int(csvData['Links']) if csvData['Links'] else 0
-        #Calculate the cost list based on the coal, iron, and beer costs
-        self.cost_list = sorted(["Coal"]*self.coal_cost + ["Iron"]*self.iron_cost)
+        #Resources placed on the tile when it is played, indexed by Age
+        self._initial_resource = (self.coal_production + self.iron_production + self.beer_production_canal,
+                                  self.coal_production + self.iron_production + self.beer_production_rail)
+        #Build cost as (coal, iron) counts, only coal and iron are ever part of a build cost
+        self.cost_counts = (self.coal_cost, self.iron_cost)
+        #Cost as a list of resource names, used as the resource locations of generated build actions
+        self.cost_list = ["Coal"]*self.coal_cost + ["Iron"]*self.iron_cost
+        self.cost_ids = (Resource.Coal,)*self.coal_cost + (Resource.Iron,)*self.iron_cost #Same as cost_list as Resource ids
+        #Beer needed to sell, as resource names for generated sell actions and as Resource ids for spend_resources
+        self.beer_list = ["Beer"]*self.beer_cost
+        self.beer_ids = (Resource.Beer,)*self.beer_cost
     
     def compare_cost_list(self, cost_list: list) -> bool:
         # Compare the cost list of the industry with the given cost list, ignoring order
-        return sorted(cost_list) == self.cost_list
+        # Counting avoids sorting, the length check rejects any resource that is not coal or iron
+        return len(cost_list) == self.coal_cost + self.iron_cost and (cost_list.count("Coal"), cost_list.count("Iron")) == self.cost_counts
+
+    def __reduce__(self):
+        # Pickle by name so game states sent to worker processes refer to the shared tiles of the receiving process
+        return (_shared_industry_properties, (self.name,))
+
+def _shared_industry_properties(name: str) -> Industry_Properties:
+    # Look up a shared tile by name, used when unpickling Industry_Properties
+    return industry_properties_dict[name]
+
+# Industry tiles never change during a game, so they are read once at import and shared by every Game_Properties
+# Each csv row is handed straight to Industry_Properties, keyed by industry and sequence, e.g. "Crate0"
+industry_properties_dict: dict[str, Industry_Properties] = {}
+csv_path = os.path.join(os.path.dirname(__file__), "industry_data.csv")
+with open(csv_path, newline='', encoding='utf-8-sig') as csvfile:
+    for row in csv.DictReader(csvfile):
+        key = sys.intern(f"{row['Industry']}{row['Sequence']}") #Interned, the same object becomes the tile name
+        industry_properties_dict[key] = Industry_Properties(key, row)
+industry_layout = ([None]*11, [None]*11, [None]*5, [None]*7, [None]*4, [None]*7) #Indexed by Industry
+for industry_tile in industry_properties_dict.values():
+    #Sizes of the board lists have been pre-allocated, so this should perform without error, if there is an error, then good because we caught something
+    industry_layout[industry_tile.industry_id][industry_tile.sequence] = industry_tile
+# Create the income level to income mapping, levels 0-10 give -10 to 0, then each income is held for two levels
+income_level_to_income = tuple(range(-10, 1)) + tuple(i for i in range(1, 12) for _ in range(2))
 
 class Game_Properties:
     def __init__(self):
-        # Create a dict of Industry_Properties based on industry_data and 
-        self.industry_dict = {key:Industry_Properties(key, data) for key, data in industry_data.items()}
-        self.industry_layout = {"Crate": [None]*11, "Shed": [None]*11, "Pottery": [None]*5, "Beer": [None]*7, "Iron": [None]*4, "Coal": [None]*7}
-        for _, industry_tile in self.industry_dict.items():
-            #Sizes of the board lists have been pre-allocated, so this should perform without error, if there is an error, then good because we caught something
-            self.industry_layout[industry_tile.industry][industry_tile.sequence] = industry_tile
-        # Create the income level to income mapping list
-        self.income_level_to_income = []
-        self.income_level_to_income.append([i for i in range(-10,1)])  # Level 0-10
-        self.income_level_to_income.extend([i for i in range(1, 12) for _ in range(2)])
-        # Setup the market return values
-        self.coal_market_cost = [1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6, 7, 7, 8]
-        self.iron_market_cost = [1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6]
+        # Reference the shared tables, these are read only
+        self.industry_dict = industry_properties_dict
+        self.industry_layout = industry_layout
+        self.income_level_to_income = income_level_to_income
+        # Setup the market return values, tuples as the properties are shared by every game
+        self.coal_market_cost = (1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6, 7, 7, 8)
+        self.iron_market_cost = (1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6)
+        # Money paid for the first i market spaces, so selling into spaces a to b pays revenue[b] - revenue[a]
+        self.coal_market_revenue = tuple(itertools.accumulate(self.coal_market_cost, initial=0))
+        self.iron_market_revenue = tuple(itertools.accumulate(self.iron_market_cost, initial=0))
         # Setup parameters
         self.starting_money = 36 #Rules say 17
 
+    def __reduce__(self):
+        # Unpickle to the shared instance of the receiving process
+        return (_shared_game_properties, ())
+
+# Game properties are read only, so a single instance is shared by every Game_State
+game_properties = Game_Properties()
+
+def _shared_game_properties() -> Game_Properties:
+    # Return the shared game properties, used when unpickling Game_Properties
+    return game_properties
+
 class Player:
+    __slots__ = ("game_properties", "money", "player_id", "player_color", "points", "income_level", "hand", "discard", "industry_next", "zhash",
+                 "_build_options")
+
     def __init__(self, player_id, player_color, game_properties: Game_Properties):
         #Set attributes
         self.game_properties = game_properties
@@ -208,32 +326,71 @@ class Player:
         self.player_color = player_color
         self.points = 0
         self.income_level = 0
-        self.hand = [] #Not yet used, concept of cards not planned to be implemented in this simulation
-        self.discard = []
-        self.industry_next = {"Crate": 0, "Shed": 0, "Pottery": 0, "Beer": 0, "Iron": 0, "Coal": 0}
+        #Hand and discard are tuples so copies can share them, rebind to a new tuple to change them (self.hand = self.hand + (card,))
+        self.hand = () #Not yet used, concept of cards not planned to be implemented in this simulation
+        self.discard = ()
+        self.industry_next = array.array("b", [0]*len(Industry)) #Next sequence to build, indexed by Industry
+        self._build_options = self._compute_build_options()
+        self.zhash = self.compute_zhash() #Zobrist hash, kept up to date by the methods that mutate the player
     
     def copy(self):
-        this = copy.copy(self)
-        this.hand = self.hand[:]
-        this.discard = self.discard[:]
-        this.industry_next = self.industry_next.copy()
+        # Copy field by field, copy.copy is much slower than building the object directly
+        this = Player.__new__(Player)
+        this.game_properties = self.game_properties
+        this.money = self.money
+        this.player_id = self.player_id
+        this.player_color = self.player_color
+        this.points = self.points
+        this.income_level = self.income_level
+        this.hand = self.hand #Tuples are shared, not copied
+        this.discard = self.discard
+        this.industry_next = self.industry_next[:]
+        this.zhash = self.zhash
+        this._build_options = self._build_options #Tuple, shared until industry_next changes
         return this
     
+    def __setstate__(self, state):
+        # Restore the slots when unpickling, then recompute the Zobrist hash rather than trust the pickled one
+        for name, value in state[1].items():
+            setattr(self, name, value)
+        self.zhash = self.compute_zhash()
+
+    def _record_prefix(self) -> str:
+        # Prefix used by Action_Controller.record, "P<player_id>"
+        return f"P{self.player_id}"
+
+    def compute_zhash(self) -> int:
+        # Compute the Zobrist hash of the player from scratch, the mutators keep self.zhash up to date incrementally
+        player_id = self.player_id
+        zhash = zobrist_key(("money", player_id, self.money)) ^ zobrist_key(("points", player_id, self.points)) ^ \
+                zobrist_key(("income_level", player_id, self.income_level)) ^ zobrist_key(("hand", player_id, self.hand))
+        for industry_id, sequence in enumerate(self.industry_next):
+            zhash ^= zobrist_key(("industry_next", player_id, (industry_id, sequence)))
+        return zhash
+
+    def _update_zhash(self, field: str, old_value, new_value):
+        # XOR the old value of a field out of the Zobrist hash and the new value in
+        self.zhash ^= zobrist_key((field, self.player_id, old_value)) ^ zobrist_key((field, self.player_id, new_value))
+
     def string_print(self):
         # Return a string representation of the player
-        industry_next_str = str([self.game_properties.industry_layout[industry][sequence].name for industry, sequence in self.industry_next.items()]).replace("'", "").replace(",", "")
+        #Industries with every tile built show as None
+        industry_next_str = "[" + " ".join(layout[sequence].name if sequence < len(layout) else "None"
+                                           for layout, sequence in zip(industry_layout, self.industry_next)) + "]"
         s = f"Player {self.player_id} ({self.player_color}): Money: {self.money}, Points: {self.points}, Income Level: {self.income_level}, Industry Next: {industry_next_str}"
         return s
       
     def build_tile(self, industry_name, controller: Action_Controller) -> Industry_Properties | str:
         #Build a tile of the specified industry type, return an industry
         #Or throw an error if the industry cannot be built
-        built_tile = self.game_properties.industry_dict[industry_name]
+        built_tile = industry_properties_dict[industry_name]
         #Check if the industry is the next to be built
-        if built_tile.sequence != self.industry_next[built_tile.industry]:
-            return controller.test(f"Invalid action: Player {self.player_id} cannot build {built_tile.name} at this time.")
+        if built_tile.sequence != self.industry_next[built_tile.industry_id]:
+            return controller.test(lambda: f"Invalid action: Player {self.player_id} cannot build {built_tile.name} at this time.")
         #Increase the industry next to be built
-        self.industry_next[built_tile.industry] += 1
+        self.industry_next[built_tile.industry_id] += 1
+        self._update_zhash("industry_next", (built_tile.industry_id, built_tile.sequence), (built_tile.industry_id, built_tile.sequence + 1))
+        self._build_options = self._compute_build_options()
         controller.record(self, built_tile.industry, delta = 1)
         #Spend the money to build the industry
         if (r := self.delta_money(-1*built_tile.money_cost, controller=controller)): return r
@@ -242,87 +399,116 @@ class Player:
 
     def develop_tile(self, industry_name, controller: Action_Controller):
         #Develop a tile by the name of the industry, coal will be spent elsewhere
-        built_tile = self.game_properties.industry_dict[industry_name]
+        built_tile = industry_properties_dict[industry_name]
         #Check if the industry is the next to be built
-        if built_tile.sequence != self.industry_next[built_tile.industry]:
-            return controller.test(f"Invalid action: Player {self.player_id} cannot build {built_tile.name} at this time.")
+        if built_tile.sequence != self.industry_next[built_tile.industry_id]:
+            return controller.test(lambda: f"Invalid action: Player {self.player_id} cannot build {built_tile.name} at this time.")
         #Increase the industry next to be built
-        self.industry_next[built_tile.industry] += 1
+        self.industry_next[built_tile.industry_id] += 1
+        self._update_zhash("industry_next", (built_tile.industry_id, built_tile.sequence), (built_tile.industry_id, built_tile.sequence + 1))
+        self._build_options = self._compute_build_options()
         controller.record(self, built_tile.industry, delta = 1)
         #Check if the industry cannot be developed because development_restriction is True
         if built_tile.development_restriction:
-            return controller.test(f"Invalid action: Player {self.player_id} cannot develop {built_tile.name} at this time.")
+            return controller.test(lambda: f"Invalid action: Player {self.player_id} cannot develop {built_tile.name} at this time.")
 
     def award_points(self, points: int, controller: Action_Controller):
         #Award points to the player
+        old_points = self.points
         self.points += points
         controller.record(self, "points", delta = points)
         #Set minimum points to 0
         if self.points < 0:
             self.points = 0
+        self._update_zhash("points", old_points, self.points)
 
     def award_income_levels(self, income_level: int, controller: Action_Controller):
         #Award income to the player
+        old_income_level = self.income_level
         self.income_level += income_level
         controller.record(self, "income_level", delta = income_level)
         #Restrain income level from 0 to 99
-        if self.income_level < 0:   
-            return controller.test(f"Invalid action: Player {self.player_id} cannot have negative income level.")
-        elif self.income_level > 99:
+        if self.income_level > 99:
             self.income_level = 99
+        self._update_zhash("income_level", old_income_level, self.income_level)
+        if self.income_level < 0:
+            return controller.test(lambda: f"Invalid action: Player {self.player_id} cannot have negative income level.")
 
     def delta_money(self, delta: int, controller: Action_Controller):
         #Change the money of the player
+        self._update_zhash("money", self.money, self.money + delta)
         self.money += delta
         controller.record(self, "money", delta = delta)
         #Error if money is negative
         if self.money < 0:
-            return controller.test(f"Invalid action: Player {self.player_id} cannot have negative money.")
+            return controller.test(lambda: f"Invalid action: Player {self.player_id} cannot have negative money.")
 
     def loan(self, controller: Action_Controller):
         #Take a loan of 30 money and move down 3 income levels
         if (r := self.delta_money(30, controller)): return r
         if (r := self.award_income_levels(-3, controller)): return r
     
-    def get_build_options(self) -> list[Industry_Properties]:
-        # Get a list of industry names that can be built by the player
-        build_options = []
-        for industry, sequence in self.industry_next.items():
-            if sequence < len(self.game_properties.industry_layout[industry]):
-                industry_tile = self.game_properties.industry_layout[industry][sequence]
-                build_options.append(industry_tile)
-        return build_options
+    def _compute_build_options(self) -> tuple[Industry_Properties, ...]:
+        # Next tile of each industry that still has tiles left, rebuilt whenever industry_next changes
+        return tuple([layout[sequence] for layout, sequence in zip(industry_layout, self.industry_next) if sequence < len(layout)])
+
+    def get_build_options(self) -> tuple[Industry_Properties, ...]:
+        # Get the industry tiles that can be built by the player, cached, so the tuple is shared and read only
+        return self._build_options
 
 class Played_Industry:
-    def __init__(self, player: Player, industry_properties: Industry_Properties, age: str):
+    __slots__ = ("player", "properties", "flipped", "resource_remaining", "index", "zhash")
+
+    def __init__(self, player: Player, industry_properties: Industry_Properties, age: Age, index: int):
         self.player = player
         self.properties = industry_properties
+        self.index = index #Position in Game_State.played_industries, part of the Zobrist feature
         #Setup the state of the played industry when played
         self.flipped = False
         #Setup resources remaining for the industry to be removed
-        self.resource_remaining = industry_properties.coal_production + industry_properties.iron_production + \
-                (industry_properties.beer_production_canal if age == "canal" else industry_properties.beer_production_rail)
+        self.resource_remaining = industry_properties._initial_resource[age]
+        self.zhash = self.compute_zhash()
         
+    def __setstate__(self, state):
+        # Restore the slots when unpickling, then recompute the Zobrist hash rather than trust the pickled one
+        #The owning player is restored first, it holds no reference back to its industries
+        for name, value in state[1].items():
+            setattr(self, name, value)
+        self.zhash = self.compute_zhash()
+
+    def _record_prefix(self) -> str:
+        # Prefix used by Action_Controller.record, the industry tile name omitting the player id
+        return self.properties.name
+
+    def compute_zhash(self) -> int:
+        # Zobrist hash of the played industry, recomputed whenever flipped or resource_remaining change
+        return zobrist_key(("industry", self.index, self.properties.name, self.player.player_id, self.flipped, self.resource_remaining))
+
     def string_print(self):
         # Return a string representation of the played industry
-        s = f"{self.properties.name}-P{self.player.player_id}-{"F" if self.flipped else "U" + str(self.resource_remaining + self.properties.beer_cost)}"
-        return s
+        name = self.properties.name
+        player_id = self.player.player_id
+        if self.flipped:
+            return f"{name}-P{player_id}-F"
+        return f"{name}-P{player_id}-U{self.resource_remaining + self.properties.beer_cost}"
 
-    def spend_resource(self, controller: Action_Controller):
-        #Spend a resource from the industry, return the resource spent
+    def spend_resource(self, controller: Action_Controller, count: int = 1):
+        #Spend count resources from the industry, return the resource spent
         #Check if the industry is flipped
         if self.flipped:
-            return controller.test(f"Invalid action: Player {self.player.player_id} cannot spend a resource from {self.properties.name} at this time.")
-        #Check if the industry has any resources remaining
-        if self.resource_remaining <= 0:
-            return controller.test(f"Invalid action: Player {self.player.player_id} cannot spend a resource from {self.properties.name} at this time.")
-        #Spend a resource from the industry
-        self.resource_remaining -= 1
-        controller.record(self, "resource", delta = -1)
+            return controller.test(lambda: f"Invalid action: Player {self.player.player_id} cannot spend a resource from {self.properties.name} at this time.")
+        #Check if the industry has enough resources remaining
+        if self.resource_remaining < count:
+            return controller.test(lambda: f"Invalid action: Player {self.player.player_id} cannot spend a resource from {self.properties.name} at this time.")
+        #Spend the resources from the industry
+        self.resource_remaining -= count
+        controller.record(self, "resource", delta = -count)
         #Check if the industry has 0 resources remaining and should therefore be flipped
         if self.resource_remaining == 0:
             self.flipped = True
             controller.record(self, "flipped", new_value = True)
+        self.zhash = self.compute_zhash()
+        if self.flipped:
             #Award the player points for the industry and income for the industry
             if (r := self.player.award_points(self.properties.points, controller)): return r
             if (r := self.player.award_income_levels(self.properties.income_levels, controller)): return r
@@ -330,20 +516,28 @@ class Played_Industry:
     def sell(self, controller: Action_Controller):
         #Sell the resource from the industry and flip. Beer cost will be handled in the game state
         #Check to ensure the industry is type Manufactured
-        if self.properties.industry_type != "Manufactured":
-            return controller.test(f"Invalid action: Player {self.player.player_id} cannot sell a resource from {self.properties.name} at this time.")
+        if not self.properties.manufactured:
+            return controller.test(lambda: f"Invalid action: Player {self.player.player_id} cannot sell a resource from {self.properties.name} at this time.")
         #Check if the industry is flipped
         if self.flipped:
-            return controller.test(f"Invalid action: Player {self.player.player_id} cannot sell a resource from {self.properties.name} at this time.")
+            return controller.test(lambda: f"Invalid action: Player {self.player.player_id} cannot sell a resource from {self.properties.name} at this time.")
         self.flipped = True
         controller.record(self, "flipped", new_value = True)
+        self.zhash = self.compute_zhash()
         #Award the player points for the industry and income for the industry
         if (r := self.player.award_points(self.properties.points, controller)): return r
         if (r := self.player.award_income_levels(self.properties.income_levels, controller)): return r
 
     def copy(self):
         # Copy the played industry to a new object (shallow copy)
-        return copy.copy(self)
+        this = Played_Industry.__new__(Played_Industry)
+        this.player = self.player
+        this.properties = self.properties
+        this.flipped = self.flipped
+        this.resource_remaining = self.resource_remaining
+        this.index = self.index
+        this.zhash = self.zhash
+        return this
 
 
 #main_actions: typing.Literal["build", "network", "develop", "sell", "loan", "scout", "pass"]
@@ -371,11 +565,17 @@ card_play.player_id.main_action.using_card:main_action_1<resources>;main_action_
 """
 
 class Action_Argument:
-    def __init__(self, argument_string:str, resources:list):
+    __slots__ = ("argument_string", "resources", "resource_ids", "tile", "location", "from_location", "to_location", "cards", "card")
+
+    def __init__(self, argument_string:str, resources:list, resource_id_tuple: tuple | None = None):
         # Initialize the action argument with its components
         # Argument string and resources must always be present, if no resources are required, then resources will be an empty list
+        # Generated actions pass the precomputed resource ids of their tile, parsed actions have them converted here
         self.argument_string = argument_string
         self.resources = resources
+        if resource_id_tuple is None:
+            resource_id_tuple = tuple([resource_ids.get(resource, -1) for resource in resources]) #-1 for unknown resources, which cannot be spent
+        self.resource_ids = resource_id_tuple
         self.tile: str
         self.location: str
         self.from_location: str
@@ -390,32 +590,37 @@ class Action_Argument:
 
 # Build an action argment for each main action type, from components, creates the string for the action argument
 class Action_Argument_Build(Action_Argument):
-    def __init__(self, tile_name: str, location: str, resources: list):
+    __slots__ = ()
+    def __init__(self, tile_name: str, location: str, resources: list, resource_id_tuple: tuple | None = None):
         # Initialize the action argument with its components
         self.tile = tile_name
         self.location = location
-        super().__init__(f"{tile_name}.{location}{self.make_resource_string(resources)}", resources)
+        super().__init__(f"{tile_name}.{location}{self.make_resource_string(resources)}", resources, resource_id_tuple)
 class Action_Argument_Network(Action_Argument):
+    __slots__ = ()
     def __init__(self, from_location: str, to_location: str, resources: list):
         # Initialize the action argument with its components
         self.from_location = from_location
         self.to_location = to_location
         super().__init__(f"{from_location}.{to_location}{self.make_resource_string(resources)}", resources)
 class Action_Argument_Develop(Action_Argument):
+    __slots__ = ()
     def __init__(self, tile_name: str, resources: list):
         self.tile = tile_name
         # Initialize the action argument with its components
         super().__init__(f"{tile_name}{self.make_resource_string(resources)}", resources)
 class Action_Argument_Sell(Action_Argument):
-    def __init__(self, tile_name: str, location: str, resources: list):
+    __slots__ = ()
+    def __init__(self, tile_name: str, location: str, resources: list, resource_id_tuple: tuple | None = None):
         self.tile = tile_name
         self.location = location
-        super().__init__(f"{tile_name}.{location}{self.make_resource_string(resources)}", resources)
+        super().__init__(f"{tile_name}.{location}{self.make_resource_string(resources)}", resources, resource_id_tuple)
 # class Action_Argument_Loan(Action_Argument):
 #     def __init__(self):
 #         # Initialize the action argument with its components
 #         super().__init__("", [])
 class Action_Argument_Scout(Action_Argument):
+    __slots__ = ()
     def __init__(self, card: str):
         # Initialize the action argument with its components
         self.card = card
@@ -425,83 +630,115 @@ class Action_Argument_Scout(Action_Argument):
 #         # Initialize the action argument with its components
 #         super().__init__("", [])
 
+# Tile, location and card names are interned so the dict lookups and comparisons they feed can short circuit on identity
+def _parse_build_argument(argument_left: str, resource_list: list) -> Action_Argument:
+    tile, location = argument_left.split(".")
+    return Action_Argument_Build(sys.intern(tile), sys.intern(location), resource_list)
+def _parse_network_argument(argument_left: str, resource_list: list) -> Action_Argument:
+    from_location, to_location = argument_left.split(".")
+    return Action_Argument_Network(sys.intern(from_location), sys.intern(to_location), resource_list)
+def _parse_develop_argument(argument_left: str, resource_list: list) -> Action_Argument:
+    return Action_Argument_Develop(sys.intern(argument_left), resource_list)
+def _parse_sell_argument(argument_left: str, resource_list: list) -> Action_Argument:
+    tile, location = argument_left.split(".")
+    return Action_Argument_Sell(sys.intern(tile), sys.intern(location), resource_list)
+def _parse_scout_argument(argument_left: str, resource_list: list) -> Action_Argument:
+    return Action_Argument_Scout(sys.intern(argument_left))
+
+# Argument parsers by main action, loan and pass take no arguments so they are not listed
+_ARGUMENT_PARSERS = {
+    "build": _parse_build_argument,
+    "network": _parse_network_argument,
+    "develop": _parse_develop_argument,
+    "sell": _parse_sell_argument,
+    "scout": _parse_scout_argument,
+}
+# Splits "left<resource,resource>" into the left side and the optional resource list in one match
+_ARGUMENT_RE = re.compile(r"^(?P<left>[^<>]*)(?:<(?P<resources>[^<>]*)>)?$")
+
+@functools.lru_cache(maxsize=65536)
 def parse_action_argment_string(argument_string: str, main_action: str) -> Action_Argument:
     # Split the argument string into its components
-    if "<" in argument_string:
-        argument_left, resource_list = argument_string.replace(">", "").split("<")
-        resource_list = resource_list.split(",")
-    else:
-        argument_left = argument_string
-        resource_list = []
-    #Make dictionaries by argument type
-    if main_action == "build":
-        tile, location = argument_left.split(".")
-        return Action_Argument_Build(tile, location, resource_list)
-    elif main_action == "network":
-        from_location, to_location = argument_left.split(".")
-        return Action_Argument_Network(from_location, to_location, resource_list)
-    elif main_action == "develop":
-        tile = argument_left
-        return Action_Argument_Develop(tile, resource_list)
-    elif main_action == "sell":
-        tile, location = argument_left.split(".")
-        return Action_Argument_Sell(tile, location, resource_list)
-    elif main_action == "loan":
-        raise ValueError(f"Invalid action argument: {argument_string}")
-    elif main_action == "scout":
-        card = argument_left
-        return Action_Argument_Scout(card)
-    elif main_action == "pass":
-        raise ValueError(f"Invalid action argument: {argument_string}")
-    else:
+    # Results are cached and shared between callers, so the returned argument must be treated as read only
+    parser = _ARGUMENT_PARSERS.get(main_action)
+    match = _ARGUMENT_RE.match(argument_string)
+    if parser is None or match is None:
         raise ValueError(f"Invalid action argument: {argument_string}")
+    resources = match.group("resources")
+    resource_list = resources.split(",") if resources is not None else []
+    return parser(match.group("left"), resource_list)
+
+class Main_Action(IntEnum):
+    # Integer opcodes of the main actions, Game_State._take_action_self looks up the handler of an action by its opcode
+    build = 0
+    network = 1
+    develop = 2
+    sell = 3
+    loan = 4
+    scout = 5
+    pass_ = 6 #"pass" is a keyword
+
+main_action_ids = {member.name: member for member in Main_Action}
+main_action_ids["pass"] = main_action_ids.pop("pass_")
 
 class Action:
-    def __init__(self, card_play:int, player_id:int, card: str, main_action: str, action_arguments_list: list[Action_Argument]):
+    __slots__ = ("card_play", "player_id", "used_card", "main_action", "main_op", "arguments", "_action_string")
+
+    def __init__(self, card_play:int, player_id:int, card: str, main_action: str, action_arguments_list: list[Action_Argument], action_string: str | None = None):
         # Initialize the action with its components
+        # action_string is passed by callers that already have it, e.g. parse_action_string
         self.card_play = card_play
         self.player_id = player_id
         self.used_card = card
         self.main_action = main_action
+        self.main_op = main_action_ids.get(main_action, -1) #-1 for unknown actions, rejected when the action is taken
         self.arguments = action_arguments_list
-        self.action_string = action_string
-        self.action_string = f"{card_play}.{player_id}.{main_action}.{card}:{';'.join([arg.argument_string for arg in action_arguments_list])}"
+        self._action_string = action_string #Otherwise built on first use by the action_string property, most generated actions are never printed
+
+    @property
+    def action_string(self) -> str:
+        # Format the action string on demand and keep it for later reads
+        if self._action_string is None:
+            self._action_string = f"{self.card_play}.{self.player_id}.{self.main_action}.{self.used_card}:{';'.join([arg.argument_string for arg in self.arguments])}"
+        return self._action_string
 
+@functools.lru_cache(maxsize=8192)
 def parse_action_string(action_string: str) -> Action:
     # Parse the action string into an Action object
-    left_side, right_side = action_string.split(":")  # separation left to right
-    card_play, player_id, main_action, used_card = left_side.split(".")
+    # Walks the string with find/index instead of splitting it into temporary lists
+    # Results are cached and shared between callers, so the returned action must be treated as read only
+    colon = action_string.index(":")  # separation left to right
+    first_dot = action_string.index(".", 0, colon)
+    second_dot = action_string.index(".", first_dot + 1, colon)
+    third_dot = action_string.index(".", second_dot + 1, colon)
+    if action_string.find(".", third_dot + 1, colon) != -1 or action_string.find(":", colon + 1) != -1:
+        raise ValueError(f"Invalid action string: {action_string}")
+    main_action = action_string[second_dot + 1:third_dot]
     action_arguments_list = []
-    for argument_string in right_side.split(";"):
-        if argument_string == "":
-            # Skip empty arguments
-            continue
-        # Parse the argument string
-        action_arguments_list.append(parse_action_argment_string(argument_string, main_action))
-    return Action(card_play=int(card_play), player_id=int(player_id), card=used_card, main_action=main_action, action_arguments_list=action_arguments_list)
-
-class Action_Parsed:
-    def __init__(self, action_string: str):
-        self.action_string = action_string
-        left_side, right_side = action_string.split(":") #separation left to right
-        card_play, player_id, self.main_action, self.used_card = left_side.split(".")
-        self.card_play = int(card_play)
-        self.player_id = int(player_id)
-        self.argument_strings = right_side.split(";")
-        self.arguments: list[Action_Argument] = []
-        for argument_string in self.argument_strings:
-            if argument_string == "":
-                # Skip empty arguments
-                continue
-            # Parse the argument string
-            self.arguments.append(parse_action_argment_string(argument_string, self.main_action))
+    start = colon + 1
+    while start <= len(action_string):
+        end = action_string.find(";", start)
+        if end == -1:
+            end = len(action_string)
+        if end > start:
+            # Parse the argument string, empty arguments are skipped
+            action_arguments_list.append(parse_action_argment_string(action_string[start:end], main_action))
+        start = end + 1
+    return Action(card_play=int(action_string[:first_dot]), player_id=int(action_string[first_dot + 1:second_dot]),
+                  card=action_string[third_dot + 1:colon], main_action=main_action, action_arguments_list=action_arguments_list,
+                  action_string=action_string)
 
 class Game_State():
+    __slots__ = ("properties", "players", "age", "round", "card_play", "active_player_index", "active_player_card",
+                 "coal_market_last_filled", "iron_market_last_filled", "played_industries", "played_links",
+                 "_owned_players", "_owned_industries", "_supply", "_industry_index", "parent", "previous_action", "lineage")
+    _record_prefix = None #Records against the game state are not scoped by Action_Controller.record
+
     def __init__(self):
         # Sets up a new game
-        self.properties = Game_Properties()
+        self.properties = game_properties
         self.players = [Player(0, "red", self.properties)]
-        self.age = "canal"
+        self.age = Age.canal
         self.round = 0 #index from 0
         self.card_play = 0  #index from 0, card play is the total number of card plays in the game
         self.active_player_index = 0
@@ -510,40 +747,123 @@ class Game_State():
         self.iron_market_last_filled = 2
         self.played_industries: list[Played_Industry] = []
         self.played_links = []
+        #Copy on write bookkeeping, indexes of the players and played industries this state owns and may mutate in place
+        #Anything not owned is shared with the parent state and must be cloned via _mutable_player / _mutable_industry before a write
+        self._owned_players: set[int] = set(range(len(self.players)))
+        self._owned_industries: set[int] = set()
+        #Indexes into played_industries of the tiles that still hold each resource, in build order
+        #The tuples are shared between states and rebound when they change
+        self._supply: list[tuple[int, ...]] = [(), (), ()] #Indexed by Resource
+        #Index into played_industries of the first tile played under each name, used by the sell lookup
+        #The dict is shared between states and replaced, never mutated, when a tile is built
+        self._industry_index: dict[str, int] = {}
         #Setup lineage, these parameters are set when using the copy method and take action method
         self.parent: Game_State = None  # Reference to the parent game state, used for tree traversal
         self.previous_action: Action = None  # The action that led to this game state, used for tree traversal
+        self.lineage: list[Game_State] = None  # States from the root to this one, kept on completed games, see get_lineage
     
     def copy(self):
-        #Copy self to a new object (shallow copy)
-        this = copy.copy(self)
-        this.players = [player.copy() for player in self.players]
-        this.played_industries = [industry.copy() for industry in self.played_industries]
+        #Copy self to a new object field by field, the copy module is too slow for the search hot path
+        this = Game_State.__new__(Game_State)
+        this.properties = self.properties
+        this.age = self.age
+        this.round = self.round
+        this.card_play = self.card_play
+        this.active_player_index = self.active_player_index
+        this.active_player_card = self.active_player_card
+        this.coal_market_last_filled = self.coal_market_last_filled
+        this.iron_market_last_filled = self.iron_market_last_filled
+        #Players and played industries are shared with self until they are written to (copy on write)
+        this.players = self.players[:]
+        this.played_industries = self.played_industries[:]
         this.played_links = self.played_links[:]
+        this._owned_players = set()
+        this._owned_industries = set()
+        #Both sides now share everything, so self must also clone before its next write or the copy would see it
+        if self._owned_players or self._owned_industries:
+            self._owned_players = set()
+            self._owned_industries = set()
+        this._supply = self._supply[:]
+        this._industry_index = self._industry_index
         # Sets the lineage attributes
         this.parent = self  # Keep the parent reference
         this.previous_action = None # Reset the previous action for the copied state
+        this.lineage = None
         return this
+
+    def get_lineage(self) -> list["Game_State"]:
+        # Return the states from the root to this one, ordered by card play
+        # Completed games carry it already, otherwise the parent chain is walked once and the result is kept
+        if self.lineage is None:
+            lineage = []
+            game = self
+            while game is not None:
+                lineage.append(game)
+                game = game.parent
+            lineage.reverse()
+            self.lineage = lineage
+        return self.lineage
+
+    def get_state_at_card_play(self, card_play: int) -> "Game_State":
+        # Return the ancestor (or self) at the given card play, each successful action advances the card play by one
+        lineage = self.get_lineage()
+        i = card_play - lineage[0].card_play
+        #A negative index would silently count from the end, e.g. for a lineage rooted at a detached copy
+        if not 0 <= i < len(lineage):
+            raise ValueError(f"Card play {card_play} is not in the lineage, which covers card plays {lineage[0].card_play} to {lineage[-1].card_play}.")
+        return lineage[i]
     
+    def _mutable_player(self, player_index: int) -> Player:
+        # Return the player at player_index, cloning it first if it is still shared with the parent state
+        if player_index not in self._owned_players:
+            self.players[player_index] = self.players[player_index].copy()
+            self._owned_players.add(player_index)
+        return self.players[player_index]
+
+    def _mutable_industry(self, industry_index: int) -> Played_Industry:
+        # Return the played industry at industry_index, cloning it first if it is still shared with the parent state
+        if industry_index not in self._owned_industries:
+            industry = self.played_industries[industry_index].copy()
+            # Point the clone at this state's copy of its owner, flipping the industry awards points and income to the owner
+            industry.player = self._mutable_player(industry.player.player_id) #Player ids match their index in self.players
+            self.played_industries[industry_index] = industry
+            self._owned_industries.add(industry_index)
+        return self.played_industries[industry_index]
+
+    def zobrist_hash(self) -> int:
+        # Return a 64 bit hash of the game state, players and industries keep their hashes up to date
+        # The few scalar fields share one key, then the links, player and industry hashes are XORed in
+        #Builtin hash() is not used, string hashes are randomized per process
+        zhash = zobrist_key(("scalars", self.age, self.round, self.card_play, self.active_player_index, self.active_player_card,
+                             self.coal_market_last_filled, self.iron_market_last_filled))
+        for link in enumerate(self.played_links):
+            zhash ^= zobrist_key(("link", link))
+        for player in self.players:
+            zhash ^= player.zhash
+        for industry in self.played_industries:
+            zhash ^= industry.zhash
+        return zhash
+
     def string_print(self, action_history_flag: bool = False) -> str:
         # Return a string representation of the game state
-        s = f"Game State: (Previous action: {self.previous_action.action_string if self.previous_action else 'None'})" + \
-            f"\n  Round: {self.round}, Card Play: {self.card_play}, Age: {self.age}, Active Player: {self.active_player_index}" + \
-            f"\n  Coal Market Last Filled: {self.coal_market_last_filled}, Iron Market Last Filled: {self.iron_market_last_filled}" + \
-            f"\n  Played Links: {self.played_links}" + \
-            f"\n  Played Industries: {str([played_industry.string_print() for played_industry in self.played_industries]).replace("'","")[1:-1]}" + \
-            f"\n  Players:"
+        # Lines are collected in a list and joined once at the end
+        parts = [f"Game State: (Previous action: {self.previous_action.action_string if self.previous_action else 'None'})",
+                 f"  Round: {self.round}, Card Play: {self.card_play}, Age: {self.age.name}, Active Player: {self.active_player_index}",
+                 f"  Coal Market Last Filled: {self.coal_market_last_filled}, Iron Market Last Filled: {self.iron_market_last_filled}",
+                 f"  Played Links: {self.played_links}",
+                 "  Played Industries: " + ", ".join([played_industry.string_print() for played_industry in self.played_industries]),
+                 "  Players:"]
         for player in self.players:
-            s += f"\n    {player.string_print()}"
-        # Print the action history
+            parts.append(f"    {player.string_print()}")
+        # Print the action history, a root state has none to walk
         if action_history_flag:
-            s += f"\n  Action History: {"None" if self.previous_action is None else ""}"
+            parts.append(f"  Action History: {'None' if self.previous_action is None else ''}")
             game = self
             while game.parent is not None:
-                s += f"\n    {"None" if game.previous_action is None else game.previous_action.action_string}"
+                parts.append(f"    {'None' if game.previous_action is None else game.previous_action.action_string}")
                 game = game.parent
         #Return the completed string
-        return s
+        return "\n".join(parts)
 
     def take_action_copy(self, action:Action, controller: Action_Controller) -> tuple["Game_State", str]:
         # Take an action returning a COPY of the game_state
@@ -559,85 +879,13 @@ class Game_State():
         #The the action specified by the action string, otherwise an error message will be thrown
         self.previous_action = action  # Set the previous action for lineage tracking
         if action.player_id != self.players[self.active_player_index].player_id:
-            return controller.test(f"Invalid action: Player {action.player_id} cannot take action during Player {self.players[self.active_player_index].player_id}'s turn.")
-        active_player = self.players[self.active_player_index]
-        # Perform the action based on the parsed arguments
-        if action.main_action == "build":
-            #Have the player remove the tile from their board spending money
-            if built_tile := active_player.build_tile(action.arguments[0].tile, controller=controller):
-                if isinstance(built_tile, str): return built_tile
-            if isinstance(built_tile, str): return built_tile #There was an error in building the tile
-            # Check if the tile can't be built due to age restrictions
-            if built_tile.age_restriction and built_tile.age_restriction != self.age:
-                return controller.test(f"Invalid action: Player {action.player_id} cannot build {built_tile.name} at this time.")
-            # Spend the resources to build the industry
-            if (r := self.spend_resources(build_location=action.arguments[0].location, resource_locations=action.arguments[0].resources,
-                                            required_resources=built_tile.cost_list, active_player=active_player, controller=controller)):
-                return r
-            # Create a new played industry and add it to the list of played industries
-            played_industry = Played_Industry(active_player, built_tile, self.age)
-            self.played_industries.append(played_industry)
-            controller.record(self, "played_industry", new_value = built_tile.name)
-            # Sell excess resources from the played industry to the market
-            if built_tile.industry == "Coal":
-                while played_industry.resource_remaining > 0 and self.coal_market_last_filled > 0:
-                    # Spend the resource to the market & award the player money
-                    if (r := played_industry.spend_resource(controller=controller)): return r
-                    self.coal_market_last_filled -= 1
-                    controller.record(self, "coal_market_last_filled", delta = -1)
-                    if (r := active_player.delta_money(self.properties.coal_market_cost[self.coal_market_last_filled], controller=controller)): return r
-            elif built_tile.industry == "Iron":
-                while played_industry.resource_remaining > 0 and self.iron_market_last_filled > 0:
-                    # Spend the resource to the market & award the player money
-                    if (r := played_industry.spend_resource(controller=controller)): return r
-                    self.iron_market_last_filled -= 1
-                    controller.record(self, "iron_market_last_filled", delta = -1)
-                    if (r := active_player.delta_money(self.properties.iron_market_cost[self.iron_market_last_filled], controller=controller)): return r
-            # Build action complete
-        elif action.main_action == "network":
-            if self.age == "canal":
-                #Build a canal link at the cost of 3 money
-                if (r := active_player.delta_money(-3, controller=controller)): return r
-            if self.age == "rail":
-                if len(action.arguments) == 1:
-                    #Build a rail link at the cost of 5 money and one coal
-                    if (r := active_player.delta_money(-5, controller=controller)): return r
-                    if (r := self.spend_resources("Unknown", ["Coal"], ["Coal"], active_player, controller=controller)): return r
-                elif len(action.arguments) == 2:
-                    #Build a rail link at the cost of 15 money, 1 coal for first link, and 1 coal + 1 beer for the second link
-                    if (r := active_player.delta_money(-15, controller=controller)): return r
-                    if (r := self.spend_resources("Unknown", ["Coal"], ["Coal"], active_player, controller=controller)): return r
-                    if (r := self.spend_resources("Unknown", ["Coal", "Beer"], ["Coal", "Beer"], active_player, controller=controller)): return r
-                else:
-                    return controller.test(f"Invalid action: Player {action.player_id} cannot build a rail link at this time.")
-            # Place the link in the played links list
-            self.played_links.append("Unknown") # Placeholder for the link, should be replaced with the actual link object
-            controller.record(self, "played_link", new_value = "Unknown")
-        elif action.main_action == "develop":
-            for argument in action.arguments:
-                if (r := active_player.develop_tile(argument.tile, controller=controller)): return r
-                if (r := self.spend_resources("Unknown", argument.resources, ["Iron"], active_player, controller=controller)): return r
-        elif action.main_action == "sell":
-            tile_name = action.arguments[0].tile
-            # Find the played industry with the specified tile name
-            played_industry = next((industry for industry in self.played_industries if industry.properties.name == tile_name), None)
-            if played_industry is None:
-                return controller.test(f"Invalid action: Player {action.player_id} cannot sell a resource from {tile_name} at this time.")
-            # Sell the good from the played industry
-            if (r := played_industry.sell(controller=controller)): return r
-            # Consume the appropriate amount of beer
-            if (r := self.spend_resources("Unknown", ["Beer"]*played_industry.properties.beer_cost, ["Beer"]*played_industry.properties.beer_cost, active_player, controller=controller)): return r
-            #This should complete the sell action
-        elif action.main_action == "loan":
-            if (r := active_player.loan(controller=controller)): return r
-        elif action.main_action == "scout":
-            #Raise an error as scouting is not yet implemented
-            return controller.test(f"Invalid action: Player {action.player_id} cannot scout at this time.")
-        elif action.main_action == "pass":
-            #Raise an error as passing is not yet implemented
-            return controller.test(f"Invalid action: Player {action.player_id} cannot pass at this time.")
-        else:
-            return controller.test(f"Invalid action: {action.main_action} is not a valid action.")
+            return controller.test(lambda: f"Invalid action: Player {action.player_id} cannot take action during Player {self.players[self.active_player_index].player_id}'s turn.")
+        active_player = self._mutable_player(self.active_player_index)
+        # Perform the action with the handler of its main action
+        handler = self._action_handlers.get(action.main_op)
+        if handler is None:
+            return controller.test(lambda: f"Invalid action: {action.main_action} is not a valid action.")
+        if (r := handler(self, action, active_player, controller)): return r
         # The action was successful, so we can move to the next card play
         self.card_play += 1
         self.active_player_card += 1
@@ -658,40 +906,169 @@ class Game_State():
         # Action was successful, return a blank string
         return ""
 
-    def spend_resources(self, build_location: str, resource_locations: list, required_resources: list, active_player: Player, controller: Action_Controller):
+    def _do_build(self, action: Action, active_player: Player, controller: Action_Controller) -> str | None:
+        # Build a tile from the player board, spending money and resources, then sell excess coal or iron to the market
+        #Have the player remove the tile from their board spending money
+        if built_tile := active_player.build_tile(action.arguments[0].tile, controller=controller):
+            if isinstance(built_tile, str): return built_tile
+        if isinstance(built_tile, str): return built_tile #There was an error in building the tile
+        # Check if the tile can't be built due to age restrictions
+        if built_tile.age_restriction is not None and built_tile.age_restriction != self.age:
+            return controller.test(lambda: f"Invalid action: Player {action.player_id} cannot build {built_tile.name} at this time.")
+        # Spend the resources to build the industry
+        if (r := self.spend_resources(build_location=action.arguments[0].location, resource_locations=action.arguments[0].resource_ids,
+                                        required_resources=built_tile.cost_ids, active_player=active_player, controller=controller)):
+            return r
+        # Create a new played industry and add it to the list of played industries
+        played_industry = Played_Industry(active_player, built_tile, self.age, len(self.played_industries))
+        self._owned_industries.add(len(self.played_industries))
+        self.played_industries.append(played_industry)
+        if built_tile.name not in self._industry_index:
+            self._industry_index = {**self._industry_index, built_tile.name: len(self.played_industries) - 1}
+        controller.record(self, "played_industry", new_value = built_tile.name)
+        # Sell excess resources from the played industry to the market
+        # As many as the market has room for are sold in one step, the player is paid for the spaces filled
+        if built_tile.industry_id == Industry.Coal:
+            sold = min(played_industry.resource_remaining, self.coal_market_last_filled)
+            if sold > 0:
+                if (r := played_industry.spend_resource(controller=controller, count=sold)): return r
+                filled = self.coal_market_last_filled
+                coal_market_revenue = self.properties.coal_market_revenue
+                self.coal_market_last_filled = filled - sold
+                controller.record(self, "coal_market_last_filled", delta = -sold)
+                if (r := active_player.delta_money(coal_market_revenue[filled] - coal_market_revenue[filled - sold], controller=controller)): return r
+        elif built_tile.industry_id == Industry.Iron:
+            sold = min(played_industry.resource_remaining, self.iron_market_last_filled)
+            if sold > 0:
+                if (r := played_industry.spend_resource(controller=controller, count=sold)): return r
+                filled = self.iron_market_last_filled
+                iron_market_revenue = self.properties.iron_market_revenue
+                self.iron_market_last_filled = filled - sold
+                controller.record(self, "iron_market_last_filled", delta = -sold)
+                if (r := active_player.delta_money(iron_market_revenue[filled] - iron_market_revenue[filled - sold], controller=controller)): return r
+        # Make the resources left on the tile available to spend_resources
+        if played_industry.resource_remaining > 0:
+            self._supply[built_tile.resource_id] = self._supply[built_tile.resource_id] + (len(self.played_industries) - 1,)
+        # Build action complete
+
+    def _do_network(self, action: Action, active_player: Player, controller: Action_Controller) -> str | None:
+        # Build a canal or rail link
+        if self.age == Age.canal:
+            #Build a canal link at the cost of 3 money
+            if (r := active_player.delta_money(-3, controller=controller)): return r
+        if self.age == Age.rail:
+            if len(action.arguments) == 1:
+                #Build a rail link at the cost of 5 money and one coal
+                if (r := active_player.delta_money(-5, controller=controller)): return r
+                if (r := self.spend_resources("Unknown", rail_link_resources, rail_link_resources, active_player, controller=controller)): return r
+            elif len(action.arguments) == 2:
+                #Build a rail link at the cost of 15 money, 1 coal for first link, and 1 coal + 1 beer for the second link
+                if (r := active_player.delta_money(-15, controller=controller)): return r
+                if (r := self.spend_resources("Unknown", rail_link_resources, rail_link_resources, active_player, controller=controller)): return r
+                if (r := self.spend_resources("Unknown", second_rail_link_resources, second_rail_link_resources, active_player, controller=controller)): return r
+            else:
+                return controller.test(lambda: f"Invalid action: Player {action.player_id} cannot build a rail link at this time.")
+        # Place the link in the played links list
+        self.played_links.append("Unknown") # Placeholder for the link, should be replaced with the actual link object
+        controller.record(self, "played_link", new_value = "Unknown")
+
+    def _do_develop(self, action: Action, active_player: Player, controller: Action_Controller) -> str | None:
+        # Remove tiles from the player board, each costs one iron
+        for argument in action.arguments:
+            if (r := active_player.develop_tile(argument.tile, controller=controller)): return r
+            if (r := self.spend_resources("Unknown", argument.resource_ids, (Resource.Iron,), active_player, controller=controller)): return r
+
+    def _do_sell(self, action: Action, active_player: Player, controller: Action_Controller) -> str | None:
+        # Flip a manufactured tile, consuming its beer
+        tile_name = action.arguments[0].tile
+        # Find the played industry with the specified tile name
+        industry_index = self._industry_index.get(tile_name)
+        if industry_index is None:
+            return controller.test(lambda: f"Invalid action: Player {action.player_id} cannot sell a resource from {tile_name} at this time.")
+        played_industry = self._mutable_industry(industry_index)
+        # Sell the good from the played industry
+        if (r := played_industry.sell(controller=controller)): return r
+        # Consume the appropriate amount of beer
+        beer_ids = played_industry.properties.beer_ids
+        if (r := self.spend_resources("Unknown", beer_ids, beer_ids, active_player, controller=controller)): return r
+        #This should complete the sell action
+
+    def _do_loan(self, action: Action, active_player: Player, controller: Action_Controller) -> str | None:
+        # Take a loan
+        return active_player.loan(controller=controller)
+
+    def _do_scout(self, action: Action, active_player: Player, controller: Action_Controller) -> str | None:
+        #Raise an error as scouting is not yet implemented
+        return controller.test(lambda: f"Invalid action: Player {action.player_id} cannot scout at this time.")
+
+    def _do_pass(self, action: Action, active_player: Player, controller: Action_Controller) -> str | None:
+        #Raise an error as passing is not yet implemented
+        return controller.test(lambda: f"Invalid action: Player {action.player_id} cannot pass at this time.")
+
+    # Main action handlers indexed by Main_Action, each returns an error string or None
+    _action_handlers = {
+        Main_Action.build: _do_build,
+        Main_Action.network: _do_network,
+        Main_Action.develop: _do_develop,
+        Main_Action.sell: _do_sell,
+        Main_Action.loan: _do_loan,
+        Main_Action.scout: _do_scout,
+        Main_Action.pass_: _do_pass,
+    }
+
+    def spend_resources(self, build_location: str, resource_locations: tuple, required_resources: tuple, active_player: Player, controller: Action_Controller):
         # This function is used to check if the resources spent are valid and flips tiles as needed
-        # Return a list of the resources spent
-        spent_resources = []
+        # Resources are given as Resource ids, -1 marks a resource that does not exist
+        # required_resources is a tuple sorted by id, as the precomputed cost tuples of the tiles are
+        #Every resource location is spent or the action fails, so the resources are checked before anything is spent
+        #Generated actions pass the tile's own cost tuple for both, which skips the sort
+        if resource_locations is not required_resources and tuple(sorted(resource_locations)) != required_resources:
+            return controller.test(lambda: f"Invalid action: Player {active_player.player_id} spent {resource_names(resource_locations)} but was supposed to spend {resource_names(required_resources)}.")
+        coal_bought = iron_bought = 0
         for resource_needed in resource_locations:
-            # For now, the locations will only be "Coal", "Iron", "Beer"
+            # For now, the locations will only be Coal, Iron, Beer
             # And will take the resource from the first avaliable location for simplicity
-            for industry in self.played_industries:
-                if industry.properties.industry == resource_needed and industry.resource_remaining > 0:
-                    if (r := industry.spend_resource(controller=controller)): return r
-                    spent_resources.append(resource_needed)
-                    break
+            supply = self._supply[resource_needed] if resource_needed >= 0 else ()
+            if supply:
+                industry = self._mutable_industry(supply[0])
+                if (r := industry.spend_resource(controller=controller)): return r
+                if industry.resource_remaining == 0:
+                    # The tile is empty, drop it from the supply
+                    self._supply[resource_needed] = supply[1:]
+            #Played industy was not found from which resource could be spent, the resource is bought from the market
+            elif resource_needed == Resource.Coal:
+                coal_bought += 1
+            elif resource_needed == Resource.Iron:
+                iron_bought += 1
             else:
-                #Played industy was not found from which resource could be spent
-                #Buy resources from the market
-                if resource_needed == "Coal":
-                    cost = self.properties.coal_market_cost[self.coal_market_last_filled]
-                    self.coal_market_last_filled = min(self.coal_market_last_filled + 1, len(self.properties.coal_market_cost) - 1)
-                    controller.record(self, "coal_market_last_filled", delta = 1)
-                elif resource_needed == "Iron":
-                    cost = self.properties.iron_market_cost[self.iron_market_last_filled]
-                    self.iron_market_last_filled = min(self.iron_market_last_filled + 1, len(self.properties.iron_market_cost) - 1)
-                    controller.record(self, "iron_market_last_filled", delta = 1)
-                else:
-                    return controller.test(f"Invalid action: Player {active_player.player_id} cannot buy {resource_needed} at this time.")
-                #Was able to buy the resource
-                spent_resources.append(resource_needed)
-                #Spend the player's money
-                if (r := active_player.delta_money(-1*cost, controller=controller)): return r
-        #Check if the resources spent are the correct resources and amounts
-        if sorted(spent_resources) != sorted(required_resources):
-            return controller.test(f"Invalid action: Player {active_player.player_id} spent {spent_resources} but was supposed to spend {required_resources}.")
+                return controller.test(lambda: f"Invalid action: Player {active_player.player_id} cannot buy {resource_names((resource_needed,))[0]} at this time.")
+        #Buy the resources from the markets in one step, each space bought costs its price and the last space is bought repeatedly
+        #Spaces a to b cost revenue[b] - revenue[a], as the revenue tables are the running totals of the costs
+        if coal_bought:
+            coal_market_cost = self.properties.coal_market_cost
+            coal_market_revenue = self.properties.coal_market_revenue
+            filled = self.coal_market_last_filled
+            priced = min(coal_bought, len(coal_market_cost) - 1 - filled)
+            cost = coal_market_revenue[filled + priced] - coal_market_revenue[filled] + (coal_bought - priced)*coal_market_cost[-1]
+            self.coal_market_last_filled = filled + priced
+            controller.record(self, "coal_market_last_filled", delta = coal_bought)
+            if (r := active_player.delta_money(-cost, controller=controller)): return r
+        if iron_bought:
+            iron_market_cost = self.properties.iron_market_cost
+            iron_market_revenue = self.properties.iron_market_revenue
+            filled = self.iron_market_last_filled
+            priced = min(iron_bought, len(iron_market_cost) - 1 - filled)
+            cost = iron_market_revenue[filled + priced] - iron_market_revenue[filled] + (iron_bought - priced)*iron_market_cost[-1]
+            self.iron_market_last_filled = filled + priced
+            controller.record(self, "iron_market_last_filled", delta = iron_bought)
+            if (r := active_player.delta_money(-cost, controller=controller)): return r
         # Resources were spent successfully, return
 
+    def action_key(self) -> tuple:
+        # Return a hashable key of everything get_untested_actions reads, states with equal keys generate identical actions
+        return (self.card_play, self.active_player_index, self.players[self.active_player_index].industry_next.tobytes(),
+                tuple([industry.properties.name for industry in self.played_industries if industry.properties.manufactured and not industry.flipped]))
+
     def get_untested_actions(self) -> list[Action]:
         # Returns a list of possible actions that have not been tested yet, leave it up to other processes to determine if the action is valid
         untested_actions = []
@@ -702,7 +1079,7 @@ class Game_State():
                 player_id=self.active_player_index,
                 card="Unknown",  # Placeholder for the card, should be replaced with the actual card object
                 main_action="build",
-                action_arguments_list=[Action_Argument_Build(industry_properties.name, "@Unknown0", industry_properties.cost_list)]
+                action_arguments_list=[Action_Argument_Build(industry_properties.name, "@Unknown0", industry_properties.cost_list, industry_properties.cost_ids)]
             )
             untested_actions.append(action)
         # Loan action
@@ -715,13 +1092,14 @@ class Game_State():
         ))
         # Sell actions -- start with only allowing a single sale
         for industry in self.played_industries:
-            if industry.properties.industry_type == "Manufactured" and not industry.flipped:
+            if industry.properties.manufactured and not industry.flipped:
                 action = Action(
                     card_play=self.card_play,
                     player_id=self.active_player_index,
                     card="Unknown",  # Placeholder for the card, should be replaced with the actual card object
                     main_action="sell",
-                    action_arguments_list=[Action_Argument_Sell(tile_name=industry.properties.name, location="$Unknown0", resources=["Beer"]*industry.properties.beer_cost)]
+                    action_arguments_list=[Action_Argument_Sell(tile_name=industry.properties.name, location="$Unknown0", resources=industry.properties.beer_list,
+                                                                 resource_id_tuple=industry.properties.beer_ids)]
                 )
                 untested_actions.append(action)
         return untested_actions
@@ -734,6 +1112,20 @@ class Supervisor:
     def __init__(self):
         self.games: list[Game_State] = []
         self.games.append(Game_State())  # Start with a single game state
+        # Transposition table, maps Game_State.zobrist_hash() to the actions that were valid from that state
+        self.transposition_table: dict[int, list[Action]] = {}
+        # Untested action cache, maps Game_State.action_key() to the actions generated for it, shared read only between states
+        self._action_cache: dict[tuple, tuple[Action, ...]] = {}
+        # Entries kept in each of the two tables above, a full table is emptied so long searches do not grow without bound
+        self.table_limit = 10000
+        # Worker pool used by complete_games_parallel, started on first use and kept so later generations skip the process start up
+        self._executor: concurrent.futures.ProcessPoolExecutor | None = None
+        self._executor_workers = 0
+
+    def fitness(self, game: Game_State) -> int:
+        # Score a game for selection into the next generation, only a single player is simulated so the score is the total points
+        #Not memoized, hashing the state costs more than the sum
+        return sum(player.points for player in game.players)
 
     def prune_and_complete(self, game: Game_State, controller: Action_Controller) -> Game_State | None:
         # Take a random previous state of the game, based on the number of card plays, trace back through parents
@@ -746,15 +1138,31 @@ class Supervisor:
     def complete_game(self, game: Game_State, controller: Action_Controller) -> Game_State | None:
         # This function will call decide_and_perform_action until the game is complete
         # Complete the game by performing actions until the game is complete
+        # The states along the way are collected so the completed game can be pruned without walking its parents
+        lineage = game.get_lineage()[:]
         while game.round < 8:
             game = self.decide_and_perform_action(game, controller=controller)
             if game is None:
                 # If there are no valid actions, break the loop
                 return None
+            lineage.append(game)
+        game.lineage = lineage
         return game
 
     def decide_and_perform_action(self, game: Game_State, controller: Action_Controller) -> Game_State | None:
         # Get the valid children of the game, choose one at random, and return the new game state
+        # When the valid actions from this state are already known, only the chosen one is applied, one copy instead of one per valid action
+        # Verbose controllers print every choice, so they still build all of the children
+        zhash = game.zobrist_hash()
+        valid_actions = self.transposition_table.get(zhash)
+        if valid_actions is not None and not controller.verbose:
+            if not valid_actions:
+                return None
+            chosen_child, return_string = game.take_action_copy(random.choice(valid_actions), silent_test_controller)
+            if not return_string:
+                return chosen_child
+            #The cached action is not valid from this state, drop the entry and expand the state in full below
+            del self.transposition_table[zhash]
         # Setup selection
         valid_children = self.get_valid_children(game, controller=silent_test_controller) #silent_test_controller is used to avoid printing test messages
         if not valid_children:
@@ -766,61 +1174,176 @@ class Supervisor:
         # Set parent lineage
         return chosen_child
 
-    def get_valid_children(self, game: Game_State, controller: Action_Controller) -> list[Game_State]:
+    def get_valid_children(self, game: Game_State, controller: Action_Controller = silent_test_controller) -> list[Game_State]:
         # Called to take a turn in a game
         # Evaluates each possible action, for the successful actions, it will return a new game state with the action applied
+        zhash = game.zobrist_hash()
+        valid_actions = self.transposition_table.get(zhash)
+        if valid_actions is not None:
+            # State was reached before (possibly by another move order), only re-apply the actions known to be valid
+            valid_children = []
+            for action in valid_actions:
+                new_game_state, return_string = game.take_action_copy(action, controller)
+                if return_string:
+                    #A cached action is not valid from this state, drop the entry and expand the state in full below
+                    del self.transposition_table[zhash]
+                    break
+                valid_children.append(new_game_state)
+            else:
+                return valid_children
         valid_children = []
-        for action in game.get_untested_actions():
+        seen = set() #Zobrist hashes of the children, actions that lead to the same state are kept once so they are not chosen more often
+        for action in self.get_untested_actions(game):
             new_game_state, return_string = game.take_action_copy(action, controller)
             if not return_string:
-                valid_children.append(new_game_state)
+                child_zhash = new_game_state.zobrist_hash()
+                if child_zhash not in seen:
+                    seen.add(child_zhash)
+                    valid_children.append(new_game_state)
+        _bounded_store(self.transposition_table, zhash, [child.previous_action for child in valid_children], self.table_limit)
         return valid_children
 
-# Example action strings
-partial_action_string = [
-    "build.card:Crate0.@Birmingham1<Coal>",
-    "build.card:Coal0.@Birmingham1",
-    "develop.card:Beer0<Iron>;Beer1<Iron>",
-    "build.card:Beer2.@Birmingham1<Iron>",
-    #"sell.card:Crate0.$Location0<Beer>"
-]
-main_game = Game_State()
-preconfigured_input_controller = Action_Controller(
-    header_string="Preconfigured Inputs",
-    starting_state_flag=True,
-    action_performed_flag=True,
-    action_detail_flag=True,
-    ending_state_flag=True,
-    series_mode_flag=True
-)
-for action_string in partial_action_string:
-    action_string = f"{main_game.card_play}.{main_game.active_player_index}.{action_string}"
-    action_sub = Action_Parsed(action_string)
-    main_game, return_string = main_game.take_action_copy(action_sub, preconfigured_input_controller)
-
-print()
-print("----------------------------------------------------")
-print()
-
-testing_controller = Action_Controller(
-    test_mode_flag=True,
-    starting_state_flag=True,
-    action_performed_flag=True,
-    action_detail_flag=True,
-    ending_state_flag=True,
-    blank_line_flag=True
-)
-completion_controller = Action_Controller(
-    header_string = "Game Completion",
-    starting_state_flag=True,
-    possible_actions_flag=True,
-    action_performed_flag=True,
-    action_detail_flag=True,
-    ending_state_flag=True,
-    ending_state_action_history_flag=True,
-    series_mode_flag=True
-)
-
-supervisor_main = Supervisor()
-# q = supervisor.get_valid_children(main_game, testing_controller)
-q = supervisor_main.complete_game(main_game, controller=completion_controller)
\ No newline at end of file
+    def get_untested_actions(self, game: Game_State) -> tuple[Action, ...]:
+        # Game_State.get_untested_actions, memoized on the features the generated actions depend on
+        # States with the same card play, build options and sellable tiles share the same actions, so they must be treated as read only
+        action_key = game.action_key()
+        untested_actions = self._action_cache.get(action_key)
+        if untested_actions is None:
+            untested_actions = tuple(game.get_untested_actions())
+            _bounded_store(self._action_cache, action_key, untested_actions, self.table_limit)
+        return untested_actions
+
+    def complete_games_parallel(self, root: Game_State, n_rollouts: int, workers: int | None = None) -> list[Game_State | None]:
+        # Complete n_rollouts independent games from root across worker processes, results are returned in submission order
+        # Each worker process keeps its own supervisor, so this supervisor's transposition table is not used or updated
+        return self._run_rollouts([root]*n_rollouts, workers)
+
+    def rollout_batch(self, leaves: list[Game_State], n_per_leaf: int, workers: int | None = None) -> list[float | None]:
+        # Score each leaf by the mean fitness of n_per_leaf random completions, all completions share one pass over the worker pool
+        # A leaf whose completions all dead end scores None
+        games = self._run_rollouts([leaf for leaf in leaves for _ in range(n_per_leaf)], workers)
+        scores = []
+        for i in range(len(leaves)):
+            leaf_scores = [self.fitness(game) for game in games[i*n_per_leaf:(i + 1)*n_per_leaf] if game is not None]
+            scores.append(sum(leaf_scores) / len(leaf_scores) if leaf_scores else None)
+        return scores
+
+    def _detached(self, game: Game_State) -> Game_State:
+        # Copy of the game without its parents, so only the state itself is pickled to the workers
+        game = game.copy()
+        game.parent = None
+        return game
+
+    def _run_rollouts(self, roots: list[Game_State], workers: int | None) -> list[Game_State | None]:
+        # Complete a game from each root on the worker pool, results are returned in the order of roots
+        # The workers get detached copies, the completed games are re-attached to the lineage of their root on return
+        seeds = [random.getrandbits(64) for _ in range(len(roots))] #Drawn here so a seeded run is reproducible
+        detached = {} #One copy per distinct root, so a repeated root is pickled once per task chunk
+        tasks = []
+        for root, seed in zip(roots, seeds):
+            if id(root) not in detached:
+                detached[id(root)] = self._detached(root)
+            tasks.append((detached[id(root)], seed))
+        workers = workers or os.cpu_count() or 1
+        chunksize = max(1, len(roots) // (4*workers)) #Several rollouts per task to amortize the pickling round trip
+        games = list(self._get_executor(workers).map(_rollout_worker, tasks, chunksize=chunksize))
+        return [self._reattached(root, game) for root, game in zip(roots, games)]
+
+    def _reattached(self, root: Game_State, game: Game_State | None) -> Game_State | None:
+        # Replace the detached copy of root at the start of a completed game's lineage with root and its ancestors
+        if game is None:
+            return None
+        if len(game.lineage) == 1:
+            #The root was already complete, the game is just its copy
+            return root
+        game.lineage[1].parent = root
+        game.lineage = root.get_lineage() + game.lineage[1:]
+        return game
+
+    def _get_executor(self, workers: int) -> concurrent.futures.ProcessPoolExecutor:
+        # Return the worker pool, restarting it only if a different number of workers is asked for
+        if self._executor is None or self._executor_workers != workers:
+            self.shutdown()
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+            self._executor_workers = workers
+        return self._executor
+
+    def shutdown(self):
+        # Stop the worker pool, if one was started, a later complete_games_parallel call starts a new one
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self) -> "Supervisor":
+        return self
+
+    def __exit__(self, *exc_info):
+        # Leaving a with block stops the worker pool, so the processes do not outlive the search
+        self.shutdown()
+
+def _bounded_store(table: dict, key, value, limit: int):
+    # Store value under key, the table is emptied first once full, the entries are rebuilt on demand from the states then in play
+    if len(table) >= limit:
+        table.clear()
+    table[key] = value
+
+@functools.cache
+def _worker_supervisor() -> Supervisor:
+    # One supervisor per worker process, so its transposition table is shared by every rollout the process runs
+    return Supervisor()
+
+def _rollout_worker(task: tuple[Game_State, int]) -> Game_State | None:
+    # Complete a single game in a worker process, module level so ProcessPoolExecutor can pickle it
+    game, seed = task
+    random.seed(seed) #Each rollout gets its own seed so the workers do not draw correlated sequences
+    return _worker_supervisor().complete_game(game, controller=silent_test_controller)
+
+if __name__ == "__main__":
+    # Example action strings
+    partial_action_string = [
+        "build.card:Crate0.@Birmingham1<Coal>",
+        "build.card:Coal0.@Birmingham1",
+        "develop.card:Beer0<Iron>;Beer1<Iron>",
+        "build.card:Beer2.@Birmingham1<Iron>",
+        #"sell.card:Crate0.$Location0<Beer>"
+    ]
+    main_game = Game_State()
+    preconfigured_input_controller = Action_Controller(
+        header_string="Preconfigured Inputs",
+        starting_state_flag=True,
+        action_performed_flag=True,
+        action_detail_flag=True,
+        ending_state_flag=True,
+        series_mode_flag=True
+    )
+    for action_string in partial_action_string:
+        action_string = f"{main_game.card_play}.{main_game.active_player_index}.{action_string}"
+        action_sub = parse_action_string(action_string)
+        main_game, return_string = main_game.take_action_copy(action_sub, preconfigured_input_controller)
+
+    print()
+    print("----------------------------------------------------")
+    print()
+
+    testing_controller = Action_Controller(
+        test_mode_flag=True,
+        starting_state_flag=True,
+        action_performed_flag=True,
+        action_detail_flag=True,
+        ending_state_flag=True,
+        blank_line_flag=True
+    )
+    completion_controller = Action_Controller(
+        header_string = "Game Completion",
+        starting_state_flag=True,
+        possible_actions_flag=True,
+        action_performed_flag=True,
+        action_detail_flag=True,
+        ending_state_flag=True,
+        ending_state_action_history_flag=True,
+        series_mode_flag=True
+    )
+
+    supervisor_main = Supervisor()
+    # q = supervisor.get_valid_children(main_game, testing_controller)
+    q = supervisor_main.complete_game(main_game, controller=completion_controller)
\ No newline at end of file